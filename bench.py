@@ -0,0 +1,136 @@
+"""Микробенчмарки слоя данных и отрисовки.
+
+Каждый сценарий запускается на отдельной синтетической SQLite-базе,
+результаты сохраняются в JSON, чтобы сравнивать прогоны:
+
+    python bench.py -o before.json
+    python bench.py -o after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from database import configure_engine, get_db, OrderStatus
+from init_db import populate_synthetic_data
+
+CATALOG_SIZES = (10, 1_000, 10_000)
+CART_SIZES = (1, 10, 50)
+ORDERS_COUNT = 100_000
+
+
+def measure(func, number: int, repeat: int = 5) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number)
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min_us": min(timings) * 1e6,
+        "median_us": statistics.median(timings) * 1e6,
+        "mean_us": statistics.fmean(timings) * 1e6,
+    }
+
+
+def synthetic_database(workdir: str, name: str, n_items: int, n_orders: int = 0) -> int:
+    configure_engine(f"sqlite:///{os.path.join(workdir, name)}.db")
+    return populate_synthetic_data(n_items=n_items, n_orders=n_orders)
+
+
+def bench_menu_keyboard(workdir: str, results: dict) -> None:
+    from keyboards import menu_keyboard
+
+    for size in CATALOG_SIZES:
+        leaf_id = synthetic_database(workdir, f"catalog_{size}", n_items=size)
+        results[f"menu_keyboard[{size}]"] = measure(lambda: menu_keyboard(leaf_id), number=50)
+
+
+def bench_cart_and_orders(workdir: str, results: dict) -> None:
+    from orders import create_order, price_cart, new_order_token
+
+    synthetic_database(workdir, "cart", n_items=1_000, n_orders=100)
+    for size in CART_SIZES:
+        cart = {item_id: 1 + item_id % 3 for item_id in range(1, size + 1)}
+
+        def run_price_cart():
+            db = next(get_db())
+            price_cart(db, cart)
+            db.close()
+
+        results[f"price_cart[{size}]"] = measure(run_price_cart, number=100)
+
+    cart = {item_id: 1 for item_id in range(1, 6)}
+
+    def run_create_order():
+        db = next(get_db())
+        create_order(db, 10_000, cart, new_order_token())
+        db.close()
+
+    results["create_order[5 lines]"] = measure(run_create_order, number=50)
+
+
+def bench_admin_view_orders(workdir: str, results: dict) -> None:
+    from bot import render_admin_orders
+
+    synthetic_database(workdir, "orders", n_items=1_000, n_orders=ORDERS_COUNT)
+    for status_filter in ("ALL", OrderStatus.NEW):
+        def run_render():
+            db = next(get_db())
+            render_admin_orders(db, status_filter)
+            db.close()
+
+        results[f"admin_view_orders[{status_filter}, {ORDERS_COUNT} orders]"] = measure(run_render, number=3, repeat=3)
+
+
+def bench_helpers(results: dict) -> None:
+    from bot import escape_markdown
+    from utils import is_cafe_open
+
+    text = "Чизкейк 'Нью-Йорк' (150 г.) - 280 руб. #1 [акция]!" * 4
+    results["escape_markdown"] = measure(lambda: escape_markdown(text), number=10_000)
+    results["is_cafe_open"] = measure(is_cafe_open, number=10_000)
+
+
+def compare(results: dict, baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    print(f"\nСравнение с {baseline_path}:")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median_us"] / baseline[name]["median_us"]
+        print(f"{name:55} {ratio:6.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Микробенчмарки бота кафе")
+    parser.add_argument("-o", "--output", default=f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        bench_helpers(results)
+        bench_menu_keyboard(workdir, results)
+        bench_cart_and_orders(workdir, results)
+        bench_admin_view_orders(workdir, results)
+
+    for name, result in results.items():
+        print(f"{name:55} {result['median_us']:12.1f} мкс")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"created_at": datetime.now().isoformat(), "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
+import asyncio
 import logging
+import os
+from datetime import timedelta
 import telegram
 from telegram import Update, constants, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
@@ -9,14 +12,16 @@ from telegram.ext import (
     MessageHandler,
     filters,
     ConversationHandler,
+    TypeHandler,
 )
 
-from config import BOT_TOKEN, ADMIN_IDS
+from config import BOT_TOKEN, ADMIN_IDS, SESSION_TTL
 from keyboards import (
     main_menu_keyboard,
     admin_menu_keyboard,
     menu_keyboard,
     item_details_keyboard,
+    pop_page_cursor,
     cart_actions_keyboard,
     confirm_order_keyboard,
     admin_order_keyboard,
@@ -24,21 +29,51 @@ from keyboards import (
 )
 from database import (
     get_db,
+    create_db_and_tables,
     User,
     Order,
-    OrderItem,
     MenuItem,
     Category,
     OrderStatus,
 )
 from utils import is_cafe_open, get_closed_message
+from message_cache import (
+    edit_message_text,
+    edit_message_reply_markup,
+    edit_or_replace_text,
+    replace_message,
+    fingerprints,
+)
+from kitchen_board import board as kitchen_board
+from orders import (
+    create_order,
+    set_order_status,
+    price_cart,
+    new_order_token,
+    orderable,
+    EmptyCartError,
+    OutOfStockError,
+)
+from photos import photo_store, PHOTO_CAPTION_LIMIT
+from maintenance import schedule_maintenance, job_stats, derived
+from broadcast import create_broadcast, start_broadcast, resume_broadcasts, active_broadcasts, stop_broadcasts
+from export import parse_period, export_orders
+from concurrency import PerUserUpdateProcessor
+from sessions import Cart, sessions
+from tracing import (
+    TracedRequest,
+    instrument,
+    registry as trace_registry,
+    start_metrics_server,
+    stop_metrics_server,
+)
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     level=logging.INFO,
 )
 logger = logging.getLogger(__name__)
-ADD_ITEM_CATEGORY, ADD_ITEM_NAME, ADD_ITEM_DESC, ADD_ITEM_PRICE = range(4)
+ADD_ITEM_CATEGORY, ADD_ITEM_NAME, ADD_ITEM_DESC, ADD_ITEM_PRICE, ADD_ITEM_PHOTO = range(5)
 
 
 def escape_markdown(text: str) -> str:
@@ -60,7 +95,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         db.commit()
     db.close()
 
-    context.user_data.setdefault('cart', {})
+    context.user_data.setdefault('cart', Cart())
     is_admin = user.id in ADMIN_IDS
 
     if not is_cafe_open() and not is_admin and not update.callback_query:
@@ -75,7 +110,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     keyboard = admin_menu_keyboard() if is_admin else main_menu_keyboard(is_admin)
 
     if update.callback_query:
-        await update.callback_query.edit_message_text(
+        await edit_message_text(
+            update.callback_query,
             text,
             reply_markup=keyboard,
             parse_mode=constants.ParseMode.MARKDOWN_V2,
@@ -94,21 +130,19 @@ async def render_cart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
 
     if not cart:
-        await query.edit_message_text("Ваша корзина пуста.", reply_markup=menu_keyboard())
+        await edit_message_text(query, "Ваша корзина пуста.", reply_markup=menu_keyboard())
     else:
         text = "🛒 *Ваша корзина:*\n\n"
-        total_price = 0
-        for item_id, quantity in cart.items():
-            item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
-            if item:
-                item_total = quantity * item.price
-                total_price += item_total
-                safe_name = escape_markdown(item.name)
-                text += f"▪️ *{safe_name}*\n_{escape_markdown(quantity)} шт\\. x {escape_markdown(item.price)}" \
-                        f" руб\\. \\= {escape_markdown(item_total)} руб\\._\n"
+        lines, total_price = price_cart(db, cart)
+        for item, quantity in lines:
+            item_total = quantity * item.price
+            safe_name = escape_markdown(item.name)
+            text += f"▪️ *{safe_name}*\n_{escape_markdown(quantity)} шт\\. x {escape_markdown(item.price)}" \
+                    f" руб\\. \\= {escape_markdown(item_total)} руб\\._\n"
 
         text += f"\n💰 *Итого:* {escape_markdown(total_price)} руб\\."
-        await query.edit_message_text(
+        await edit_message_text(
+            query,
             text,
             parse_mode=constants.ParseMode.MARKDOWN_V2,
             reply_markup=cart_actions_keyboard(),
@@ -116,6 +150,25 @@ async def render_cart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     db.close()
 
 
+def render_admin_orders(db, status_filter: str) -> str:
+    orders_query = db.query(Order).order_by(Order.created_at.desc())
+    if status_filter != "ALL":
+        orders = orders_query.filter(Order.status == status_filter).all()
+        text = f"📋 Заказы в статусе '{status_filter}':\n\n"
+    else:
+        orders = orders_query.limit(10).all()
+        text = "📋 Последние 10 заказов:\n\n"
+    if not orders:
+        text += "Заказов в этой категории нет."
+    else:
+        for order in orders:
+            user_first_name = order.user.first_name if order.user else "Удален"
+            text += f"Заказ #{order.id} от {user_first_name}\n"
+            text += f"Статус: {order.status}\nСумма: {order.total_price} руб.\n"
+            text += f"Детали: /details_{order.id}\n\n"
+    return text
+
+
 async def my_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     db = next(get_db())
@@ -138,16 +191,14 @@ async def my_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text += f"Статус: *{safe_status}* \\| Сумма: *{escape_markdown(order.total_price)} руб*\n\n"
 
     try:
-        await update.callback_query.edit_message_text(
+        await edit_message_text(
+            update.callback_query,
             text,
             parse_mode=constants.ParseMode.MARKDOWN_V2 if orders else None,
             reply_markup=main_menu_keyboard(is_admin=user_id in ADMIN_IDS),
         )
     except telegram.error.BadRequest as e:
-        if "Message is not modified" in str(e):
-            pass
-        else:
-            logger.error(f"Ошибка при обновлении 'Моих заказов': {e}")
+        logger.error(f"Ошибка при обновлении 'Моих заказов': {e}")
 
     db.close()
 
@@ -167,67 +218,109 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     await query.answer()
     db = next(get_db())
-    context.user_data.setdefault('cart', {})
+    context.user_data.setdefault('cart', Cart())
 
     if data == "start":
         await start(update, context)
     elif data == "start_user_menu":
-        await query.edit_message_text(
+        await edit_message_text(
+            query,
             "Главное меню клиента:", reply_markup=main_menu_keyboard(is_admin=is_admin)
         )
     elif data == "show_menu":
-        await query.edit_message_text(
+        await edit_message_text(
+            query,
             "Выберите категорию:", reply_markup=menu_keyboard()
         )
     elif data.startswith("category_"):
-        category_id = int(data.split("_")[1])
+        parts = data.split("_")
+        category_id = int(parts[1])
+        after = before = None
+        if len(parts) == 3 and parts[2][:1] in ("a", "b") and parts[2][1:].isdigit():
+            if parts[2][0] == "a":
+                after = int(parts[2][1:])
+            else:
+                before = int(parts[2][1:])
         category = db.query(Category).get(category_id)
         if category:
+            has_subcategories = db.query(Category.id).filter(Category.parent_id == category_id).first() is not None
             text = (
                 f"Выбрана категория '{category.name}'. Выберите подкатегорию:"
-                if category.subcategories
+                if has_subcategories
                 else f"Товары в категории '{category.name}':"
             )
-            if not category.subcategories and not category.items:
+            visible_items = db.query(MenuItem.id).filter(MenuItem.category_id == category_id)
+            if not is_admin:
+                visible_items = visible_items.filter(orderable())
+            if not has_subcategories and visible_items.first() is None:
                 text += "\n\nЗдесь пока нет товаров."
-            await query.edit_message_text(
-                text=text, reply_markup=menu_keyboard(category_id)
+            await edit_message_text(
+                query,
+                text=text, reply_markup=menu_keyboard(category_id, after=after, before=before, is_admin=is_admin)
             )
         else:
-            await query.edit_message_text(
+            await edit_message_text(
+                query,
                 "Категория не найдена.", reply_markup=menu_keyboard()
             )
 
     elif data.startswith("item_"):
         parts = data.split('_')
+        page_after = pop_page_cursor(parts)
         if len(parts) == 2:
             item_id = int(parts[1])
             item = db.query(MenuItem).get(item_id)
             if item:
                 text = f"*{escape_markdown(item.name)}* \\({escape_markdown(item.price)} руб\\.\\)\n\n_{escape_markdown(item.description or 'Описание отсутствует')}_"
-                await query.edit_message_text(
-                    text,
-                    parse_mode=constants.ParseMode.MARKDOWN_V2,
-                    reply_markup=item_details_keyboard(item_id, is_admin=is_admin),
-                )
+                if is_admin:
+                    stock = "не ограничен" if item.stock is None else item.stock
+                    hidden = ", скрыто" if not item.is_available else ""
+                    text += escape_markdown(f"\n\nID: {item.id}, остаток: {stock}{hidden}")
+                keyboard = item_details_keyboard(item_id, is_admin=is_admin, page_after=page_after)
+                sent_photo = False
+                if photo_store.file_id(item) and len(text) <= PHOTO_CAPTION_LIMIT:
+                    try:
+                        await photo_store.send(
+                            context.bot,
+                            query.message.chat_id,
+                            item,
+                            caption=text,
+                            parse_mode=constants.ParseMode.MARKDOWN_V2,
+                            reply_markup=keyboard,
+                        )
+                        sent_photo = True
+                    except telegram.error.TelegramError as e:
+                        logger.warning(f"Не удалось отправить фото блюда {item_id}, показываю текст: {e}")
+                if sent_photo:
+                    await replace_message(query)
+                else:
+                    await edit_or_replace_text(
+                        query,
+                        text,
+                        parse_mode=constants.ParseMode.MARKDOWN_V2,
+                        reply_markup=keyboard,
+                    )
         elif len(parts) == 3 and parts[1] == "back":
             item_id = int(parts[2])
             item = db.query(MenuItem).get(item_id)
             if item:
-                await query.edit_message_text(
+                await edit_or_replace_text(
+                    query,
                     text=f"Товары в категории '{item.category.name}':",
-                    reply_markup=menu_keyboard(item.category.id),
+                    reply_markup=menu_keyboard(item.category.id, after=page_after, is_admin=is_admin),
                 )
         elif len(parts) == 4 and parts[1] in ["incr", "decr"]:
             item_id = int(parts[2])
             quantity = int(parts[3])
             if quantity > 0:
-                await query.edit_message_reply_markup(
-                    reply_markup=item_details_keyboard(item_id, quantity, is_admin)
+                await edit_message_reply_markup(
+                    query,
+                    reply_markup=item_details_keyboard(item_id, quantity, is_admin, page_after)
                 )
 
     elif data.startswith("cart_"):
         parts = data.split('_')
+        page_after = pop_page_cursor(parts)
         action = parts[1]
         cart = context.user_data['cart']
         if action == "add" and parts[2] == "many":
@@ -239,9 +332,10 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             )
             item = db.query(MenuItem).get(item_id)
             if item:
-                await query.edit_message_text(
+                await edit_or_replace_text(
+                    query,
                     text=f"Товары в категории '{item.category.name}':",
-                    reply_markup=menu_keyboard(item.category.id),
+                    reply_markup=menu_keyboard(item.category.id, after=page_after, is_admin=is_admin),
                 )
 
     elif data == "noop":
@@ -250,8 +344,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif data == "cart":
         await render_cart(update, context)
     elif data == "clear_cart":
-        context.user_data['cart'] = {}
-        await query.edit_message_text(
+        context.user_data['cart'] = Cart()
+        await edit_message_text(
+            query,
             "Корзина очищена.",
             reply_markup=main_menu_keyboard(is_admin=is_admin),
         )
@@ -259,116 +354,88 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif data == "place_order":
         cart = context.user_data.get('cart', {})
         if not cart:
-            await query.edit_message_text("Корзина пуста.", reply_markup=menu_keyboard())
+            await edit_message_text(query, "Корзина пуста.", reply_markup=menu_keyboard())
         else:
             text = "🔍 *Проверьте ваш заказ*\n\n"
-            total_price = 0
-            for item_id, quantity in cart.items():
-                item = db.query(MenuItem).get(item_id)
-                if item:
-                    item_total = quantity * item.price
-                    total_price += item_total
-                    text += f"▪️ *{escape_markdown(item.name)}* \\({escape_markdown(quantity)} шт\\.\\) \\= {escape_markdown(item_total)} руб\\.\n"
+            lines, total_price = price_cart(db, cart)
+            for item, quantity in lines:
+                item_total = quantity * item.price
+                text += f"▪️ *{escape_markdown(item.name)}* \\({escape_markdown(quantity)} шт\\.\\) \\= {escape_markdown(item_total)} руб\\.\n"
             text += f"\n💰 *Итого к оплате:* {escape_markdown(total_price)} руб\\."
-            await query.edit_message_text(
+            await edit_message_text(
+                query,
                 text,
                 parse_mode=constants.ParseMode.MARKDOWN_V2,
-                reply_markup=confirm_order_keyboard(),
+                reply_markup=confirm_order_keyboard(new_order_token()),
             )
 
-    elif data == "confirm_order":
+    elif data.startswith("confirm_order"):
         cart = context.user_data.get('cart', {})
         user_id = query.from_user.id
-        if cart:
-            total_price = sum(
-                db.query(MenuItem).get(item_id).price * quantity
-                for item_id, quantity in cart.items()
-                if db.query(MenuItem).get(item_id)
-            )
-            new_order = Order(
-                user_id=user_id, total_price=total_price, status=OrderStatus.NEW
+        token = data[len("confirm_order_"):] or new_order_token()
+        try:
+            new_order, created = create_order(db, user_id, cart, token)
+        except EmptyCartError:
+            new_order, created = None, False
+            await edit_message_text(query, "Корзина пуста.", reply_markup=menu_keyboard())
+        except OutOfStockError as e:
+            new_order, created = None, False
+            await edit_message_text(
+                query,
+                f"😔 Недостаточно в наличии: {', '.join(e.item_names)}.\nИзмените корзину и попробуйте снова.",
+                reply_markup=cart_actions_keyboard(),
             )
-            db.add(new_order)
-            db.flush()
-
-            details_text = f"🔔 *Новый заказ `#{new_order.id}`*\n\nОт: {escape_markdown(query.from_user.first_name)} \\(@{escape_markdown(query.from_user.username or 'N/A')}\\)\n\n"
-            for item_id, quantity in cart.items():
-                item = db.query(MenuItem).get(item_id)
-                if item:
-                    db.add(
-                        OrderItem(
-                            order_id=new_order.id,
-                            item_name=item.name,
-                            quantity=quantity,
-                            price=item.price,
-                        )
-                    )
-                    details_text += f"▪️ {escape_markdown(item.name)}: {escape_markdown(quantity)} шт\\.\n"
-            details_text += f"\n💰 *Итого:* {escape_markdown(total_price)} руб\\."
-            db.commit()
 
-            context.user_data['cart'] = {}
-            await query.edit_message_text(
+        if new_order:
+            if created:
+                context.user_data['cart'] = Cart()
+            await edit_message_text(
+                query,
                 f"✅ Ваш заказ `#{new_order.id}` принят\\!",
                 parse_mode=constants.ParseMode.MARKDOWN_V2,
                 reply_markup=main_menu_keyboard(is_admin=is_admin),
             )
-
-            for admin_id in ADMIN_IDS:
-                try:
-                    await context.bot.send_message(
-                        chat_id=admin_id,
-                        text=details_text,
-                        parse_mode=constants.ParseMode.MARKDOWN_V2,
-                        reply_markup=admin_order_keyboard(new_order.id),
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Не удалось отправить уведомление админу {admin_id}: {e}"
-                    )
+            if created:
+                kitchen_board.mark_dirty(context.job_queue)
 
     elif data == "my_orders":
         await my_orders(update, context)
 
     elif data == "admin_panel":
         if is_admin:
-            await query.edit_message_text(
+            await edit_message_text(
+                query,
                 "Панель администратора:", reply_markup=admin_menu_keyboard()
             )
 
     elif data.startswith("admin_view_orders_"):
         status_filter = data.split('_')[-1]
-        orders_query = db.query(Order).order_by(Order.created_at.desc())
-        if status_filter != "ALL":
-            orders = orders_query.filter(Order.status == status_filter).all()
-            text = f"📋 Заказы в статусе '{status_filter}':\n\n"
-        else:
-            orders = orders_query.limit(10).all()
-            text = "📋 Последние 10 заказов:\n\n"
-        if not orders:
-            text += "Заказов в этой категории нет."
-        else:
-            for order in orders:
-                user_first_name = order.user.first_name if order.user else "Удален"
-                text += f"Заказ #{order.id} от {user_first_name}\n"
-                text += f"Статус: {order.status}\nСумма: {order.total_price} руб.\n"
-                text += f"Детали: /details_{order.id}\n\n"
+        text = render_admin_orders(db, status_filter)
         try:
-            await query.edit_message_text(text, reply_markup=admin_menu_keyboard())
+            await edit_message_text(query, text, reply_markup=admin_menu_keyboard())
         except telegram.error.BadRequest as e:
-            if "Message is not modified" in str(e):
-                pass
-            else:
-                logger.error(f"ОШИБКА BadRequest при отправке текста: {text}\n{e}")
+            logger.error(f"ОШИБКА BadRequest при отправке текста: {text}\n{e}")
 
     elif data.startswith("admin_status_"):
         _, _, order_id_str, new_status = data.split("_")
         order = db.query(Order).get(int(order_id_str))
         if order:
-            order.status = new_status
+            try:
+                set_order_status(db, order, new_status)
+            except OutOfStockError as e:
+                db.rollback()
+                await edit_message_text(
+                    query,
+                    f"Нельзя вернуть заказ #{order.id} в работу: не хватает {', '.join(e.item_names)}.",
+                    reply_markup=admin_order_keyboard(order.id),
+                )
+                db.close()
+                return
             db.commit()
+            kitchen_board.mark_dirty(context.job_queue)
             safe_status = escape_markdown(new_status)
-            await query.edit_message_text(
+            await edit_message_text(
+                query,
                 f"Статус заказа `#{order.id}` изменен на *{safe_status}*",
                 parse_mode=constants.ParseMode.MARKDOWN_V2,
                 reply_markup=admin_menu_keyboard(),
@@ -410,7 +477,8 @@ async def add_item_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     ]
     keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel_action")])
 
-    await query.edit_message_text(
+    await edit_message_text(
+        query,
         "Выберите КОНЕЧНУЮ категорию для нового блюда:",
         reply_markup=InlineKeyboardMarkup(keyboard),
     )
@@ -423,7 +491,8 @@ async def add_item_category(
     query = update.callback_query
     await query.answer()
     context.user_data['new_item'] = {'category_id': int(query.data)}
-    await query.edit_message_text(
+    await edit_message_text(
+        query,
         "Отлично! Теперь введите название нового блюда:",
         reply_markup=cancel_keyboard(),
     )
@@ -470,12 +539,36 @@ async def add_item_price(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return ADD_ITEM_PRICE
 
+    context.user_data['new_item']['price'] = int(price_text)
+    await update.message.reply_text(
+        "Цена сохранена. Теперь отправьте фото блюда (или /skip):",
+        reply_markup=cancel_keyboard(),
+    )
+    return ADD_ITEM_PHOTO
+
+
+async def add_item_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    photo_sizes = update.message.photo
+    context.user_data['new_item']['photo_file_id'] = photo_sizes[-1].file_id
+    item_id = await save_new_item(update, context)
+    photo_store.remember(item_id, photo_sizes[-1].file_id)
+    await photo_store.save_thumbnail(context.bot, item_id, photo_sizes)
+    return ConversationHandler.END
+
+
+async def add_item_skip_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await save_new_item(update, context)
+    return ConversationHandler.END
+
+
+async def save_new_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     new_item_data = context.user_data['new_item']
-    new_item_data['price'] = int(price_text)
 
     db = next(get_db())
-    db.add(MenuItem(**new_item_data))
+    new_item = MenuItem(**new_item_data)
+    db.add(new_item)
     db.commit()
+    item_id = new_item.id
     db.close()
 
     await update.message.reply_text(
@@ -485,7 +578,7 @@ async def add_item_price(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await update.message.reply_text(
         "Админ-панель:", reply_markup=admin_menu_keyboard()
     )
-    return ConversationHandler.END
+    return item_id
 
 
 async def cancel_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -496,7 +589,8 @@ async def cancel_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     keyboard = admin_menu_keyboard() if is_admin else main_menu_keyboard()
 
     if update.callback_query:
-        await update.callback_query.edit_message_text(
+        await edit_message_text(
+            update.callback_query,
             "Действие отменено.", reply_markup=keyboard
         )
     else:
@@ -539,8 +633,191 @@ async def handle_details_link(
     db.close()
 
 
+async def set_item_stock(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+
+    args = context.args
+    if len(args) != 2 or not args[0].isdigit() or not (args[1].isdigit() or args[1] == "-"):
+        await update.message.reply_text("Использование: /stock <ID блюда> <количество или - без ограничения>")
+        return
+
+    db = next(get_db())
+    item = db.query(MenuItem).get(int(args[0]))
+    if not item:
+        await update.message.reply_text(f"Блюдо #{args[0]} не найдено.")
+    else:
+        item.stock = None if args[1] == "-" else int(args[1])
+        db.commit()
+        stock = "без ограничения" if item.stock is None else f"{item.stock} шт."
+        await update.message.reply_text(f"Остаток '{item.name}': {stock}")
+    db.close()
+
+
+async def set_item_availability(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+
+    is_available = update.message.text.startswith("/show")
+    if len(context.args) != 1 or not context.args[0].isdigit():
+        await update.message.reply_text("Использование: /hide <ID блюда> или /show <ID блюда>")
+        return
+
+    db = next(get_db())
+    item = db.query(MenuItem).get(int(context.args[0]))
+    if not item:
+        await update.message.reply_text(f"Блюдо #{context.args[0]} не найдено.")
+    else:
+        item.is_available = is_available
+        db.commit()
+        state = "снова доступно" if is_available else "скрыто из меню"
+        await update.message.reply_text(f"Блюдо '{item.name}' {state}.")
+    db.close()
+
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    admin_id = update.effective_user.id
+    if admin_id not in ADMIN_IDS:
+        return
+
+    parts = update.message.text.split(maxsplit=1)
+    text = parts[1].strip() if len(parts) > 1 else ""
+    if not text:
+        broadcasts = active_broadcasts()
+        if not broadcasts:
+            await update.message.reply_text(
+                "Активных рассылок нет.\nЧтобы начать, отправьте: /broadcast <текст сообщения>"
+            )
+            return
+        lines = []
+        for b in broadcasts:
+            line = f"Рассылка #{b.id}: доставлено {b.sent}, ошибок {b.failed}, последний id {b.last_user_id}"
+            if start_broadcast(context.application, b.id):
+                line += " (была остановлена, перезапущена)"
+            lines.append(line)
+        await update.message.reply_text("\n".join(lines))
+        return
+
+    broadcast_id = create_broadcast(text, admin_id)
+    start_broadcast(context.application, broadcast_id)
+    await update.message.reply_text(
+        f"📣 Рассылка #{broadcast_id} запущена. Прогресс: /broadcast"
+    )
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+
+    try:
+        start_date, end_date = parse_period(context.args)
+    except ValueError:
+        await update.message.reply_text(
+            "Использование: /export [ГГГГ-ММ] или /export ГГГГ-ММ-ДД ГГГГ-ММ-ДД\n"
+            "Без аргументов выгружается прошлый месяц."
+        )
+        return
+
+    await update.message.reply_text("⏳ Готовлю выгрузку заказов...")
+    path, count = await asyncio.to_thread(export_orders, start_date, end_date)
+    try:
+        last_day = end_date.date() - timedelta(days=1)
+        with open(path, "rb") as document:
+            await update.message.reply_document(
+                document,
+                filename=f"orders_{start_date:%Y-%m-%d}_{last_day:%Y-%m-%d}.csv.gz",
+                caption=f"Заказы с {start_date:%d.%m.%Y} по {last_day:%d.%m.%Y}: {count} строк",
+            )
+    finally:
+        os.remove(path)
+
+
+async def post_init(application: Application) -> None:
+    await start_metrics_server(application)
+    resume_broadcasts(application)
+
+
+async def track_session(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if update.effective_user:
+        await sessions.touch(update.effective_user.id, context.user_data)
+
+
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+
+    cache = fingerprints.stats()
+    text = "📊 Статистика бота\n\n"
+    text += (
+        f"Кэш отпечатков сообщений: {cache['entries']}/{cache['max_entries']}\n"
+        f"Пропущено повторных правок: {cache['hits']} из {cache['hits'] + cache['misses']} "
+        f"({cache['hit_rate']:.1%})\n"
+        f"Доска кухни: {kitchen_board.renders} перерисовок\n"
+    )
+
+    update_processor = context.application.update_processor
+    if isinstance(update_processor, PerUserUpdateProcessor):
+        queue = update_processor.stats()
+        text += (
+            f"\nОбработка апдейтов: {queue['running']}/{queue['workers']} в работе, "
+            f"в очереди {queue['queued']} (макс. {queue['max_queued']}), всего {queue['processed']}, отброшено {queue['dropped']}\n"
+            f"Ожидание в очереди p50 / p95: {queue['wait_p50'] * 1000:.0f} / {queue['wait_p95'] * 1000:.0f} мс\n"
+        )
+
+    memory = sessions.stats(context.application)
+    text += (
+        f"\nСессии: {memory['sessions']} в памяти, активных {memory['active']}, "
+        f"с корзиной {memory['carts']} ({memory['cart_bytes'] / 1024:.1f} КБ)\n"
+        f"Вытеснено {memory['evicted']}, корзин сохранено {memory['spilled']}, восстановлено {memory['restored']}\n"
+    )
+
+    if job_stats:
+        text += "\nФоновые задачи:\n"
+        for stats in job_stats.values():
+            text += (
+                f"▪️ {stats.name}: {stats.runs} запусков, последний {stats.last_duration * 1000:.0f} мс, "
+                f"ошибок {stats.failures}, пропусков {stats.skipped}\n"
+            )
+    routes = trace_registry.routes()
+    if routes:
+        text += f"\nЗадержки (p50 / p95, мс), медленных апдейтов: {trace_registry.slow_updates}\n"
+        for route in routes:
+            histogram = trace_registry.histograms[(route, "total")]
+            text += (
+                f"▪️ {route}: {histogram.percentile(0.5) * 1000:.0f} / "
+                f"{histogram.percentile(0.95) * 1000:.0f} ({histogram.count})\n"
+            )
+    if derived["popular_items"]:
+        text += "\nПопулярное за 30 дней:\n"
+        for name, total in derived["popular_items"]:
+            text += f"▪️ {name}: {total} шт.\n"
+    await update.message.reply_text(text)
+
+
+async def show_kitchen_board(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    admin_id = update.effective_user.id
+    if admin_id not in ADMIN_IDS:
+        return
+
+    kitchen_board.reset(admin_id)
+    kitchen_board.mark_dirty(context.job_queue)
+
+
 def main() -> None:
-    application = Application.builder().token(BOT_TOKEN).build()
+    create_db_and_tables()
+    update_processor = PerUserUpdateProcessor()
+    trace_registry.add_collector(update_processor.prometheus_lines)
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(update_processor)
+        .request(TracedRequest(connection_pool_size=256))
+        .post_init(post_init)
+        .post_stop(stop_broadcasts)
+        .post_shutdown(stop_metrics_server)
+        .build()
+    )
+    schedule_maintenance(application.job_queue)
 
     add_item_handler = ConversationHandler(
         entry_points=[
@@ -562,20 +839,33 @@ def main() -> None:
             ADD_ITEM_PRICE: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, add_item_price)
             ],
+            ADD_ITEM_PHOTO: [
+                MessageHandler(filters.PHOTO, add_item_photo),
+                CommandHandler('skip', add_item_skip_photo),
+            ],
         },
         fallbacks=[
             CallbackQueryHandler(cancel_action, pattern='^cancel_action$'),
             CommandHandler('cancel', cancel_action),
         ],
         per_message=False,
+        conversation_timeout=SESSION_TTL,
     )
 
+    application.add_handler(TypeHandler(Update, track_session), group=-1)
     application.add_handler(add_item_handler)
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("stats", show_stats))
+    application.add_handler(CommandHandler("board", show_kitchen_board))
+    application.add_handler(CommandHandler("stock", set_item_stock))
+    application.add_handler(CommandHandler(["hide", "show"], set_item_availability))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("export", export_command))
     application.add_handler(
         MessageHandler(filters.Regex(r'^\/details_\d+$'), handle_details_link)
     )
     application.add_handler(CallbackQueryHandler(button_handler))
+    instrument(application)
 
     print("Бот запущен...")
     application.run_polling()
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+import telegram
+from sqlalchemy import select
+
+from config import BROADCAST_RATE, BROADCAST_BURST, BROADCAST_FETCH_SIZE
+from database import get_db, User, Broadcast, BroadcastStatus
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Ограничитель скорости: не больше `rate` отправок в секунду, всплески до `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+rate_limiter = TokenBucket(BROADCAST_RATE, BROADCAST_BURST)
+_running = {}
+
+
+def create_broadcast(text: str, admin_id: int) -> int:
+    db = next(get_db())
+    broadcast = Broadcast(text=text, created_by=admin_id)
+    db.add(broadcast)
+    db.commit()
+    broadcast_id = broadcast.id
+    db.close()
+    return broadcast_id
+
+
+def active_broadcasts():
+    db = next(get_db())
+    broadcasts = db.query(Broadcast).filter(Broadcast.status == BroadcastStatus.RUNNING).all()
+    db.close()
+    return broadcasts
+
+
+async def _deliver(bot, user_id: int, text: str) -> bool:
+    while True:
+        await rate_limiter.acquire()
+        try:
+            await bot.send_message(chat_id=user_id, text=text)
+            return True
+        except telegram.error.RetryAfter as e:
+            logger.warning(f"Рассылка упёрлась в лимит Telegram, пауза {e.retry_after} с")
+            await asyncio.sleep(e.retry_after)
+        except telegram.error.TelegramError as e:
+            logger.info(f"Рассылка: не удалось доставить сообщение {user_id}: {e}")
+            return False
+
+
+def _next_recipients(after_user_id: int):
+    db = next(get_db())
+    user_ids = [
+        user_id
+        for (user_id,) in db.execute(
+            select(User.id).where(User.id > after_user_id).order_by(User.id).limit(BROADCAST_FETCH_SIZE)
+        )
+    ]
+    db.close()
+    return user_ids
+
+
+async def run_broadcast(bot, broadcast_id: int) -> None:
+    """Отправляет рассылку всем пользователям по возрастанию id, продолжая с last_user_id.
+
+    Получатели читаются пачками по ключу (id > последнего), чтобы не держать
+    открытый курсор всю рассылку; прогресс сохраняется после каждого
+    получателя, поэтому прерванная рассылка продолжится с места остановки.
+    Если задача упала, рассылка остаётся RUNNING и перезапускается командой
+    /broadcast или при следующем старте бота.
+    """
+    progress_db = next(get_db())
+    progress_db.expire_on_commit = False
+    try:
+        broadcast = progress_db.query(Broadcast).get(broadcast_id)
+        while True:
+            user_ids = _next_recipients(broadcast.last_user_id)
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                if await _deliver(bot, user_id, broadcast.text):
+                    broadcast.sent += 1
+                else:
+                    broadcast.failed += 1
+                broadcast.last_user_id = user_id
+                progress_db.commit()
+
+        broadcast.status = BroadcastStatus.DONE
+        broadcast.finished_at = datetime.utcnow()
+        progress_db.commit()
+        logger.info(f"Рассылка #{broadcast_id} завершена: доставлено {broadcast.sent}, ошибок {broadcast.failed}")
+    except Exception:
+        progress_db.rollback()
+        logger.exception(f"Рассылка #{broadcast_id} прервана ошибкой, её можно перезапустить через /broadcast")
+    finally:
+        progress_db.close()
+        _running.pop(broadcast_id, None)
+
+
+def start_broadcast(application, broadcast_id: int) -> bool:
+    """Запускает рассылку фоновой задачей, которую отслеживаем сами, а не Application.
+
+    Задачи Application.create_task дожидаются при остановке бота, а
+    рассылка может идти часами; вместо этого stop_broadcasts отменяет их,
+    и при следующем запуске они продолжатся с сохранённого места.
+    Возвращает False, если рассылка уже идёт.
+    """
+    if broadcast_id in _running:
+        return False
+    _running[broadcast_id] = asyncio.create_task(run_broadcast(application.bot, broadcast_id))
+    return True
+
+
+def resume_broadcasts(application) -> None:
+    for broadcast in active_broadcasts():
+        logger.info(f"Возобновляю рассылку #{broadcast.id} после пользователя {broadcast.last_user_id}")
+        start_broadcast(application, broadcast.id)
+
+
+async def stop_broadcasts(application=None) -> None:
+    tasks = list(_running.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
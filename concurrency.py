@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import BaseUpdateProcessor
+
+from config import UPDATE_WORKERS, UPDATE_QUEUE_LIMIT, UPDATE_PER_USER_LIMIT
+from tracing import Histogram, BUCKETS
+
+logger = logging.getLogger(__name__)
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка апдейтов разных пользователей с сохранением порядка для одного.
+
+    Апдейты одного пользователя (или чата, если пользователя нет) идут
+    строго по очереди, поэтому context.user_data['cart'] не гоняется сам с
+    собой. Одновременно выполняется не больше `workers` апдейтов.
+
+    Базовый семафор PTB ограничивает общее число принятых, но ещё не
+    завершённых апдейтов (`queue_limit`), и апдейт занимает в нём слот, пока
+    ждёт своей очереди у пользователя. Чтобы один пользователь, много раз
+    нажавший кнопку, не занял все слоты, у одного ключа ожидает не больше
+    `per_user_limit` апдейтов, лишние отбрасываются (на нажатие кнопки
+    при этом сразу отвечаем, чтобы у клиента не висел индикатор загрузки).
+    """
+
+    def __init__(
+        self,
+        workers: int = UPDATE_WORKERS,
+        queue_limit: int = UPDATE_QUEUE_LIMIT,
+        per_user_limit: int = UPDATE_PER_USER_LIMIT,
+    ):
+        super().__init__(queue_limit)
+        self.workers = workers
+        self.per_user_limit = per_user_limit
+        self._workers = asyncio.Semaphore(workers)
+        self._keys = {}
+        self.queued = 0
+        self.running = 0
+        self.processed = 0
+        self.max_queued = 0
+        self.dropped = 0
+        self.wait_histogram = Histogram()
+
+    @staticmethod
+    def _key(update):
+        if isinstance(update, Update):
+            if update.effective_user:
+                return "user", update.effective_user.id
+            if update.effective_chat:
+                return "chat", update.effective_chat.id
+        return None
+
+    def _acquire_key(self, key) -> asyncio.Lock:
+        entry = self._keys.get(key)
+        if entry is None:
+            entry = self._keys[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _release_key(self, key) -> None:
+        entry = self._keys[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._keys[key]
+
+    async def do_process_update(self, update, coroutine) -> None:
+        key = self._key(update)
+        entry = self._keys.get(key)
+        if entry is not None and entry[1] >= self.per_user_limit:
+            coroutine.close()
+            self.dropped += 1
+            logger.warning(f"Слишком много апдейтов от {key[0]} {key[1]}, апдейт {update.update_id} отброшен")
+            if update.callback_query:
+                try:
+                    await update.callback_query.answer("Слишком много нажатий, подождите немного.")
+                except TelegramError as e:
+                    logger.warning(f"Не удалось ответить на отброшенное нажатие: {e}")
+            return
+        queued_at = time.perf_counter()
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        lock = self._acquire_key(key) if key is not None else None
+        started = False
+        try:
+            if lock is not None:
+                await lock.acquire()
+            try:
+                async with self._workers:
+                    self.queued -= 1
+                    started = True
+                    self.wait_histogram.observe(time.perf_counter() - queued_at)
+                    self.running += 1
+                    try:
+                        await coroutine
+                    finally:
+                        self.running -= 1
+                        self.processed += 1
+            finally:
+                if lock is not None:
+                    lock.release()
+        finally:
+            if not started:
+                self.queued -= 1
+            if key is not None:
+                self._release_key(key)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "wait_p50": self.wait_histogram.percentile(0.5),
+            "wait_p95": self.wait_histogram.percentile(0.95),
+        }
+
+    def prometheus_lines(self):
+        histogram = self.wait_histogram
+        lines = [
+            "# TYPE bot_update_queue_depth gauge",
+            f"bot_update_queue_depth {self.queued}",
+            "# TYPE bot_updates_running gauge",
+            f"bot_updates_running {self.running}",
+            "# TYPE bot_updates_dropped_total counter",
+            f"bot_updates_dropped_total {self.dropped}",
+            "# TYPE bot_update_queue_wait_seconds histogram",
+        ]
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram.counts):
+            cumulative += count
+            lines.append(f'bot_update_queue_wait_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'bot_update_queue_wait_seconds_bucket{{le="+Inf"}} {histogram.count}')
+        lines.append(f"bot_update_queue_wait_seconds_sum {histogram.sum}")
+        lines.append(f"bot_update_queue_wait_seconds_count {histogram.count}")
+        return lines
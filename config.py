@@ -6,3 +6,35 @@ OPEN_HOUR = 11
 CLOSE_HOUR = 22
 
 TIMEZONE = 'Europe/Moscow'
+
+MESSAGE_CACHE_SIZE = 5000
+KITCHEN_BOARD_INTERVAL = 5
+
+PHOTO_DIR = 'media/thumbnails'
+THUMBNAIL_MAX_SIZE = 320
+
+ORDER_EXPIRE_MINUTES = 60
+ORDER_EXPIRE_INTERVAL = 300
+DERIVED_REFRESH_INTERVAL = 900
+MAINTENANCE_HOUR = 4
+
+SLOW_UPDATE_SECONDS = 1.0
+TRACE_WINDOW = 1000
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9108
+
+MENU_PAGE_SIZE = 10
+
+BROADCAST_RATE = 25
+BROADCAST_BURST = 5
+BROADCAST_FETCH_SIZE = 500
+
+EXPORT_BATCH_SIZE = 1000
+
+UPDATE_WORKERS = 8
+UPDATE_QUEUE_LIMIT = 256
+UPDATE_PER_USER_LIMIT = 8
+
+SESSION_TTL = 1800
+SESSION_SWEEP_INTERVAL = 300
+SPILL_EVICTED_CARTS = True
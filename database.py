@@ -1,10 +1,19 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, DateTime, ForeignKey, Text, Boolean, LargeBinary
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from datetime import datetime
 
 DATABASE_URL = "sqlite:///cafe_bot.db"
 
 engine = create_engine(DATABASE_URL)
+
+
+@event.listens_for(engine, "connect")
+def _enable_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -30,7 +39,7 @@ class Category(Base):
     __tablename__ = "categories"
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, nullable=False)
-    parent_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
 
     parent = relationship("Category", remote_side=[id], back_populates="subcategories")
     subcategories = relationship("Category", back_populates="parent", cascade="all, delete-orphan")
@@ -43,7 +52,10 @@ class MenuItem(Base):
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     price = Column(Integer, nullable=False)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
+    photo_file_id = Column(String, nullable=True)
+    stock = Column(Integer, nullable=True)  # None - без ограничения
+    is_available = Column(Boolean, nullable=False, default=True, server_default="1")
     category = relationship("Category", back_populates="items")
 
 
@@ -54,6 +66,8 @@ class Order(Base):
     status = Column(String, default=OrderStatus.NEW, nullable=False)
     total_price = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    idempotency_key = Column(String, unique=True, index=True, nullable=True)
+    stock_reserved = Column(Boolean, nullable=False, default=False, server_default="0")  # остатки списаны под заказ
 
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
@@ -63,6 +77,7 @@ class OrderItem(Base):
     __tablename__ = "order_items"
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"))
+    menu_item_id = Column(Integer, ForeignKey("menu_items.id"), nullable=True)
     item_name = Column(String)
     quantity = Column(Integer)
     price = Column(Integer)
@@ -70,8 +85,71 @@ class OrderItem(Base):
     order = relationship("Order", back_populates="items")
 
 
+class BroadcastStatus:
+    RUNNING = "running"
+    DONE = "done"
+
+
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    created_by = Column(Integer, nullable=False)
+    status = Column(String, default=BroadcastStatus.RUNNING, nullable=False, index=True)
+    last_user_id = Column(Integer, default=0, nullable=False)  # последний обработанный получатель
+    sent = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class SavedCart(Base):
+    __tablename__ = "saved_carts"
+    user_id = Column(Integer, primary_key=True)
+    item_ids = Column(LargeBinary, nullable=False)
+    quantities = Column(LargeBinary, nullable=False)
+    saved_at = Column(DateTime, default=datetime.utcnow)
+
+
+class BoardMessage(Base):
+    __tablename__ = "board_messages"
+    admin_id = Column(Integer, primary_key=True)
+    message_id = Column(Integer, nullable=False)
+
+
+def _add_missing_columns():
+    """Досоздаёт колонки и индексы, добавленные в модели после создания базы."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(engine.dialect)
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    ddl += f" DEFAULT {getattr(default, 'text', default)}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def configure_engine(database_url: str):
+    """Переключает приложение на другую базу (например, синтетическую для бенчмарков)."""
+    global engine
+    engine = create_engine(database_url)
+    event.listen(engine, "connect", _enable_wal)
+    SessionLocal.configure(bind=engine)
+    return engine
+
+
 def create_db_and_tables():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
 
 
 def get_db():
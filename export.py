@@ -0,0 +1,109 @@
+"""Потоковая выгрузка заказов в CSV для бухгалтерии.
+
+    python export.py 2026-09 -o orders_2026-09.csv.gz
+    python export.py 2026-09-01 2026-09-15 -o orders.csv
+"""
+import argparse
+import csv
+import gzip
+import os
+import tempfile
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import select
+
+from config import EXPORT_BATCH_SIZE
+from database import get_db, Order, OrderItem, User
+
+EXPORT_HEADER = [
+    "order_id", "created_at", "status", "order_total",
+    "user_id", "username", "first_name",
+    "item_name", "quantity", "price", "line_total",
+]
+
+
+def parse_period(args):
+    """Период [начало, конец) из аргументов: 'ГГГГ-ММ', 'ГГГГ-ММ-ДД ГГГГ-ММ-ДД' или прошлый месяц."""
+    if not args:
+        first_of_month = date.today().replace(day=1)
+        start = (first_of_month - timedelta(days=1)).replace(day=1)
+        end = first_of_month
+    elif len(args) == 1:
+        start = datetime.strptime(args[0], "%Y-%m").date()
+        end = (start + timedelta(days=32)).replace(day=1)
+    elif len(args) == 2:
+        start = datetime.strptime(args[0], "%Y-%m-%d").date()
+        end = datetime.strptime(args[1], "%Y-%m-%d").date() + timedelta(days=1)
+    else:
+        raise ValueError("ожидается 'ГГГГ-ММ' или две даты 'ГГГГ-ММ-ДД'")
+    return datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+
+
+def iter_order_rows(db, start: datetime, end: datetime):
+    statement = (
+        select(
+            Order.id, Order.created_at, Order.status, Order.total_price,
+            Order.user_id, User.username, User.first_name,
+            OrderItem.item_name, OrderItem.quantity, OrderItem.price,
+        )
+        .select_from(Order)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(User, User.id == Order.user_id)
+        .where(Order.created_at >= start, Order.created_at < end)
+        .order_by(Order.id, OrderItem.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    yield from db.execute(statement)
+
+
+def write_orders_csv(fileobj, start: datetime, end: datetime) -> int:
+    """Пишет строки заказов за период в открытый текстовый файл. Возвращает число строк."""
+    writer = csv.writer(fileobj)
+    writer.writerow(EXPORT_HEADER)
+    db = next(get_db())
+    count = 0
+    try:
+        for row in iter_order_rows(db, start, end):
+            (order_id, created_at, status, order_total,
+             user_id, username, first_name, item_name, quantity, price) = row
+            writer.writerow([
+                order_id, created_at.strftime("%Y-%m-%d %H:%M:%S") if created_at else "", status, order_total,
+                user_id, username or "", first_name or "",
+                item_name, quantity, price, (quantity or 0) * (price or 0),
+            ])
+            count += 1
+    finally:
+        db.close()
+    return count
+
+
+def _open_output(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8-sig", newline="")
+    return open(path, "w", encoding="utf-8-sig", newline="")
+
+
+def export_orders(start: datetime, end: datetime, path: str = None):
+    """Выгружает заказы в файл (по умолчанию во временный .csv.gz). Возвращает (путь, число строк)."""
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="orders_", suffix=".csv.gz")
+        os.close(fd)
+    with _open_output(path) as f:
+        count = write_orders_csv(f, start, end)
+    return path, count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Выгрузка заказов в CSV")
+    parser.add_argument("period", nargs="*", help="ГГГГ-ММ или две даты ГГГГ-ММ-ДД (по умолчанию прошлый месяц)")
+    parser.add_argument("-o", "--output", help="файл результата; .gz включает сжатие")
+    args = parser.parse_args()
+
+    start, end = parse_period(args.period)
+    output = args.output or f"orders_{start:%Y-%m-%d}_{end:%Y-%m-%d}.csv.gz"
+    path, count = export_orders(start, end, output)
+    print(f"Выгружено строк: {count} -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,18 @@
 import os
-from database import create_db_and_tables, SessionLocal, Category, MenuItem
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from database import create_db_and_tables, SessionLocal, Category, MenuItem, User, Order, OrderItem, OrderStatus
+
+SYNTHETIC_STATUSES = [
+    OrderStatus.NEW,
+    OrderStatus.IN_PROGRESS,
+    OrderStatus.READY,
+    OrderStatus.COMPLETED,
+    OrderStatus.CANCELLED,
+]
 
 
 def populate_initial_data():
@@ -145,5 +158,72 @@ def populate_initial_data():
     print("Заполнение базы данных новыми данными завершено.")
 
 
+def _insert_chunked(db, model, rows, chunk_size=5000):
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(model), rows[start:start + chunk_size])
+
+
+def populate_synthetic_data(n_items: int, n_orders: int = 0, n_users: int = 1000, seed: int = 0):
+    """Заполняет текущую базу синтетическим каталогом и историей заказов.
+
+    Все блюда попадают в одну конечную категорию, чтобы нагрузить её
+    постраничный вывод. Возвращает id этой категории.
+    """
+    rng = random.Random(seed)
+    create_db_and_tables()
+    db = SessionLocal()
+
+    root = Category(name="🧪 Синтетика")
+    db.add(root)
+    db.flush()
+    leaf = Category(name="Все позиции", parent_id=root.id)
+    db.add(leaf)
+    db.flush()
+    leaf_id = leaf.id
+
+    _insert_chunked(db, MenuItem, [
+        {
+            "name": f"Позиция {i}",
+            "description": f"Синтетическое блюдо номер {i}.",
+            "price": rng.randint(50, 900),
+            "category_id": leaf_id,
+        }
+        for i in range(1, n_items + 1)
+    ])
+    _insert_chunked(db, User, [
+        {"id": 10_000 + i, "username": f"user{i}", "first_name": f"Гость {i}"}
+        for i in range(n_users)
+    ])
+
+    item_ids = [item_id for (item_id,) in db.query(MenuItem.id).filter(MenuItem.category_id == leaf_id)]
+    started = datetime.utcnow() - timedelta(days=365)
+    orders, order_items = [], []
+    for order_id in range(1, n_orders + 1):
+        lines = [(rng.choice(item_ids), rng.randint(1, 3), rng.randint(50, 900)) for _ in range(rng.randint(1, 3))]
+        orders.append({
+            "id": order_id,
+            "user_id": 10_000 + rng.randrange(n_users),
+            "status": rng.choice(SYNTHETIC_STATUSES),
+            "total_price": sum(quantity * price for _, quantity, price in lines),
+            "created_at": started + timedelta(seconds=order_id * 300),
+        })
+        order_items.extend(
+            {
+                "order_id": order_id,
+                "menu_item_id": item_id,
+                "item_name": f"Позиция {item_id}",
+                "quantity": quantity,
+                "price": price,
+            }
+            for item_id, quantity, price in lines
+        )
+    _insert_chunked(db, Order, orders)
+    _insert_chunked(db, OrderItem, order_items)
+
+    db.commit()
+    db.close()
+    return leaf_id
+
+
 if __name__ == "__main__":
     populate_initial_data()
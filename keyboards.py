@@ -1,5 +1,7 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from database import get_db, Category, Order, OrderStatus
+from config import MENU_PAGE_SIZE
+from database import get_db, Category, MenuItem, Order, OrderStatus
+from orders import orderable
 from utils import is_cafe_open
 
 
@@ -30,7 +32,50 @@ def admin_menu_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
-def menu_keyboard(category_id=None):
+def keyset_page(query, id_column, after=None, before=None, page_size=MENU_PAGE_SIZE):
+    """Страница строк по ключу id без OFFSET: после `after` или перед `before`.
+
+    Если по курсору ничего не нашлось (позиции раскупили или скрыли),
+    возвращается первая страница. Возвращает (строки, есть_предыдущая, есть_следующая).
+    """
+    if before is not None:
+        rows = query.filter(id_column < before).order_by(id_column.desc()).limit(page_size + 1).all()
+        if rows:
+            has_prev = len(rows) > page_size
+            return list(reversed(rows[:page_size])), has_prev, True
+    elif after is not None:
+        rows = query.filter(id_column > after).order_by(id_column).limit(page_size + 1).all()
+        if rows:
+            return rows[:page_size], True, len(rows) > page_size
+
+    rows = query.order_by(id_column).limit(page_size + 1).all()
+    return rows[:page_size], False, len(rows) > page_size
+
+
+def page_suffix(page_after=None) -> str:
+    """Хвост callback_data, по которому можно вернуться на ту же страницу категории."""
+    return f"_a{page_after}" if page_after is not None else ""
+
+
+def pop_page_cursor(parts):
+    """Снимает с разобранного callback_data хвост `a<id>`, если он есть."""
+    if len(parts) > 2 and parts[-1][:1] == "a" and parts[-1][1:].isdigit():
+        return int(parts.pop()[1:])
+    return None
+
+
+def item_button_label(item, is_admin: bool = False) -> str:
+    label = f"{item.name} ({item.price} руб.)"
+    if is_admin:
+        if not item.is_available:
+            label = f"🙈 {label}, скрыто"
+        elif item.stock is not None and item.stock <= 0:
+            label = f"⛔ {label}, нет в наличии"
+    return label
+
+
+def menu_keyboard(category_id=None, after=None, before=None, is_admin: bool = False):
+    """Клавиатура меню; админы видят и скрытые, и закончившиеся блюда с пометкой."""
     db = next(get_db())
     if category_id is None:
         categories = db.query(Category).filter(Category.parent_id.is_(None)).all()
@@ -38,14 +83,29 @@ def menu_keyboard(category_id=None):
         keyboard.append([InlineKeyboardButton("⬅️ В главное меню", callback_data="start")])
     else:
         current_category = db.query(Category).get(category_id)
+        subcategories = db.query(Category).filter(Category.parent_id == category_id)
         keyboard = []
-        if current_category.subcategories:
-            for sub in current_category.subcategories:
+        if subcategories.first() is not None:
+            rows, has_prev, has_next = keyset_page(subcategories, Category.id, after, before)
+            for sub in rows:
                 keyboard.append([InlineKeyboardButton(sub.name, callback_data=f"category_{sub.id}")])
-        elif current_category.items:
-            for item in current_category.items:
-                keyboard.append(
-                    [InlineKeyboardButton(f"{item.name} ({item.price} руб.)", callback_data=f"item_{item.id}")])
+        else:
+            items = db.query(MenuItem).filter(MenuItem.category_id == category_id)
+            if not is_admin:
+                items = items.filter(orderable())
+            rows, has_prev, has_next = keyset_page(items, MenuItem.id, after, before)
+            suffix = page_suffix(rows[0].id - 1 if has_prev else None)
+            for item in rows:
+                keyboard.append([InlineKeyboardButton(
+                    item_button_label(item, is_admin), callback_data=f"item_{item.id}{suffix}")])
+
+        navigation = []
+        if has_prev:
+            navigation.append(InlineKeyboardButton("◀️", callback_data=f"category_{category_id}_b{rows[0].id}"))
+        if has_next:
+            navigation.append(InlineKeyboardButton("▶️", callback_data=f"category_{category_id}_a{rows[-1].id}"))
+        if navigation:
+            keyboard.append(navigation)
 
         if current_category.parent_id is None:
             keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data="show_menu")])
@@ -56,21 +116,22 @@ def menu_keyboard(category_id=None):
     return InlineKeyboardMarkup(keyboard)
 
 
-def item_details_keyboard(item_id: int, quantity: int = 1, is_admin: bool = False):
+def item_details_keyboard(item_id: int, quantity: int = 1, is_admin: bool = False, page_after=None):
     if quantity < 1: quantity = 1
+    suffix = page_suffix(page_after)
 
     keyboard = [
         [
-            InlineKeyboardButton("➖", callback_data=f"item_decr_{item_id}_{quantity - 1}"),
+            InlineKeyboardButton("➖", callback_data=f"item_decr_{item_id}_{quantity - 1}{suffix}"),
             InlineKeyboardButton(f"{quantity} шт.", callback_data="noop"),
-            InlineKeyboardButton("➕", callback_data=f"item_incr_{item_id}_{quantity + 1}")
+            InlineKeyboardButton("➕", callback_data=f"item_incr_{item_id}_{quantity + 1}{suffix}")
         ]
     ]
     if is_cafe_open() or is_admin:
         keyboard.append([InlineKeyboardButton(f"🛒 Добавить в корзину ({quantity})",
-                                              callback_data=f"cart_add_many_{item_id}_{quantity}")])
+                                              callback_data=f"cart_add_many_{item_id}_{quantity}{suffix}")])
 
-    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data=f"item_back_{item_id}")])
+    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data=f"item_back_{item_id}{suffix}")])
     return InlineKeyboardMarkup(keyboard)
 
 
@@ -86,9 +147,9 @@ def cart_actions_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 
-def confirm_order_keyboard():
+def confirm_order_keyboard(order_token: str):
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton("👍 Подтвердить заказ", callback_data="confirm_order")],
+        [InlineKeyboardButton("👍 Подтвердить заказ", callback_data=f"confirm_order_{order_token}")],
         [InlineKeyboardButton("⬅️ Вернуться в корзину", callback_data="cart")]
     ])
 
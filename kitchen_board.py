@@ -0,0 +1,172 @@
+import logging
+import time
+
+import telegram
+from sqlalchemy.orm import joinedload
+
+from config import ADMIN_IDS, KITCHEN_BOARD_INTERVAL
+from database import get_db, Order, OrderStatus, BoardMessage
+from message_cache import fingerprints, text_fingerprint, markup_fingerprint
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (OrderStatus.NEW, OrderStatus.IN_PROGRESS, OrderStatus.READY)
+STATUS_ICONS = {
+    OrderStatus.NEW: "🆕",
+    OrderStatus.IN_PROGRESS: "🍳",
+    OrderStatus.READY: "✅",
+}
+MAX_MESSAGE_LENGTH = 4096
+
+
+def render_board_text():
+    """Возвращает текст доски и id заказов в статусе NEW."""
+    db = next(get_db())
+    orders = (
+        db.query(Order)
+        .options(joinedload(Order.user))
+        .filter(Order.status.in_(ACTIVE_STATUSES))
+        .order_by(Order.created_at)
+        .all()
+    )
+    db.close()
+
+    grouped = {status: [] for status in ACTIVE_STATUSES}
+    for order in orders:
+        grouped[order.status].append(order)
+    new_ids = [order.id for order in grouped[OrderStatus.NEW]]
+
+    text = "📌 Кухня: активные заказы\n"
+    if not orders:
+        return text + "\nАктивных заказов нет.", new_ids
+
+    for status, status_orders in grouped.items():
+        text += f"\n{STATUS_ICONS[status]} {status} ({len(status_orders)})\n"
+        for order in status_orders:
+            user_first_name = order.user.first_name if order.user else "Удален"
+            line = f"#{order.id} {user_first_name}, {order.total_price} руб. /details_{order.id}\n"
+            if len(text) + len(line) > MAX_MESSAGE_LENGTH - 64:
+                return text + "…список обрезан, откройте «Все заказы».", new_ids
+            text += line
+    return text, new_ids
+
+
+def _load_message_ids() -> dict:
+    db = next(get_db())
+    message_ids = {row.admin_id: row.message_id for row in db.query(BoardMessage).all()}
+    db.close()
+    return message_ids
+
+
+def _save_message_id(admin_id: int, message_id: int) -> None:
+    db = next(get_db())
+    db.merge(BoardMessage(admin_id=admin_id, message_id=message_id))
+    db.commit()
+    db.close()
+
+
+class KitchenBoard:
+    """Закреплённое у каждого админа сообщение со списком активных заказов.
+
+    Изменения копятся через mark_dirty() и отрисовываются одной правкой
+    не чаще, чем раз в `interval` секунд. Правки Telegram не озвучивает,
+    поэтому о заказах NEW, которых не было на прошлой отрисовке, админам
+    приходит одно короткое уведомление на всю пачку. id сообщений доски
+    хранятся в базе, чтобы после перезапуска править ту же доску.
+    """
+
+    def __init__(self, interval: float = KITCHEN_BOARD_INTERVAL):
+        self.interval = interval
+        self.message_ids = None
+        self._stale_ids = {}
+        self._notified_ids = set()
+        self.pending_changes = 0
+        self.renders = 0
+        self._last_render = 0.0
+        self._scheduled = False
+
+    def mark_dirty(self, job_queue) -> None:
+        self.pending_changes += 1
+        if self._scheduled:
+            return
+        delay = max(0.0, self._last_render + self.interval - time.monotonic())
+        job_queue.run_once(self._render_job, delay, name="kitchen_board")
+        self._scheduled = True
+
+    def reset(self, admin_id: int) -> None:
+        """Следующая отрисовка отправит доску заново, а старую удалит."""
+        if self.message_ids is None:
+            self.message_ids = _load_message_ids()
+        message_id = self.message_ids.pop(admin_id, None)
+        if message_id is not None:
+            fingerprints.forget((admin_id, message_id))
+            self._stale_ids[admin_id] = message_id
+
+    async def _render_job(self, context) -> None:
+        self._scheduled = False
+        self._last_render = time.monotonic()
+        batched, self.pending_changes = self.pending_changes, 0
+        self.renders += 1
+
+        if self.message_ids is None:
+            self.message_ids = _load_message_ids()
+        text, new_ids = render_board_text()
+        fresh_ids = [order_id for order_id in new_ids if order_id not in self._notified_ids]
+        self._notified_ids = set(new_ids)
+
+        logger.info(f"Обновление доски кухни ({batched} изменений)")
+        for admin_id in ADMIN_IDS:
+            try:
+                await self._publish(context.bot, admin_id, text)
+            except Exception as e:
+                logger.error(f"Не удалось обновить доску кухни у админа {admin_id}: {e}")
+            if fresh_ids:
+                await self._notify(context.bot, admin_id, fresh_ids)
+
+    async def _notify(self, bot, admin_id: int, order_ids) -> None:
+        numbers = ", ".join(f"#{order_id}" for order_id in order_ids)
+        text = f"🔔 Новые заказы ({len(order_ids)}): {numbers}. Подробности на доске кухни."
+        try:
+            await bot.send_message(chat_id=admin_id, text=text)
+        except Exception as e:
+            logger.error(f"Не удалось отправить уведомление админу {admin_id}: {e}")
+
+    async def _publish(self, bot, admin_id: int, text: str) -> None:
+        text_fp = text_fingerprint(text)
+        markup_fp = markup_fingerprint(None)
+        message_id = self.message_ids.get(admin_id)
+
+        if message_id is not None:
+            key = (admin_id, message_id)
+            if fingerprints.text_unchanged(key, text_fp, markup_fp):
+                return
+            try:
+                await bot.edit_message_text(text, chat_id=admin_id, message_id=message_id)
+                fingerprints.remember_text(key, text_fp, markup_fp)
+                return
+            except telegram.error.BadRequest as e:
+                if "Message is not modified" in str(e):
+                    fingerprints.remember_text(key, text_fp, markup_fp)
+                    return
+                logger.warning(f"Доска кухни у админа {admin_id} недоступна, отправляю заново: {e}")
+                self.reset(admin_id)
+
+        message = await bot.send_message(chat_id=admin_id, text=text)
+        self.message_ids[admin_id] = message.message_id
+        _save_message_id(admin_id, message.message_id)
+        fingerprints.remember_text((admin_id, message.message_id), text_fp, markup_fp)
+        stale_id = self._stale_ids.pop(admin_id, None)
+        if stale_id is not None:
+            try:
+                await bot.delete_message(chat_id=admin_id, message_id=stale_id)
+            except telegram.error.TelegramError as e:
+                logger.warning(f"Не удалось удалить старую доску кухни у админа {admin_id}: {e}")
+        try:
+            await bot.pin_chat_message(
+                chat_id=admin_id, message_id=message.message_id, disable_notification=True
+            )
+        except telegram.error.TelegramError as e:
+            logger.warning(f"Не удалось закрепить доску кухни у админа {admin_id}: {e}")
+
+
+board = KitchenBoard()
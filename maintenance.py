@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, date, time as dt_time
+
+import pytz
+from sqlalchemy import func, text
+
+from config import (
+    TIMEZONE,
+    ORDER_EXPIRE_MINUTES,
+    ORDER_EXPIRE_INTERVAL,
+    DERIVED_REFRESH_INTERVAL,
+    MAINTENANCE_HOUR,
+    SESSION_SWEEP_INTERVAL,
+)
+from database import get_db, Order, OrderItem, OrderStatus
+from kitchen_board import board as kitchen_board
+from orders import cancel_order
+from sessions import sessions
+
+logger = logging.getLogger(__name__)
+
+
+class JobStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_duration = 0.0
+        self.total_duration = 0.0
+        self.last_run = None
+
+
+job_stats = {}
+derived = {"popular_items": [], "refreshed_at": None}
+
+
+def guarded(name: str, job):
+    """Оборачивает задачу: замеряет время выполнения и не даёт запускам накладываться."""
+    stats = job_stats.setdefault(name, JobStats(name))
+
+    async def callback(context):
+        if stats.running:
+            stats.skipped += 1
+            logger.warning(f"Задача '{name}' ещё выполняется, запуск пропущен")
+            return
+        stats.running = True
+        started = time.perf_counter()
+        try:
+            await job(context)
+            stats.runs += 1
+        except Exception:
+            stats.failures += 1
+            logger.exception(f"Ошибка в задаче обслуживания '{name}'")
+        finally:
+            stats.running = False
+            stats.last_duration = time.perf_counter() - started
+            stats.total_duration += stats.last_duration
+            stats.last_run = datetime.utcnow()
+
+    return callback
+
+
+def _expire_stale_orders():
+    cutoff = datetime.utcnow() - timedelta(minutes=ORDER_EXPIRE_MINUTES)
+    db = next(get_db())
+    stale = (
+        db.query(Order)
+        .filter(Order.status == OrderStatus.NEW, Order.created_at < cutoff)
+        .all()
+    )
+    expired = [(order.id, order.user_id) for order in stale]
+    for order in stale:
+        cancel_order(db, order)
+    db.commit()
+    db.close()
+    return expired
+
+
+async def expire_stale_orders(context):
+    expired = await asyncio.to_thread(_expire_stale_orders)
+    if not expired:
+        return
+
+    logger.info(f"Отменено просроченных заказов: {len(expired)}")
+    kitchen_board.mark_dirty(context.job_queue)
+    for order_id, user_id in expired:
+        try:
+            await context.bot.send_message(
+                chat_id=user_id,
+                text=f"Заказ #{order_id} отменен: кафе не успело его принять. Оформите, пожалуйста, заказ заново.",
+            )
+        except Exception as e:
+            logger.error(f"Не удалось отправить уведомление клиенту {user_id}: {e}")
+
+
+def _optimize_database():
+    db = next(get_db())
+    db.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    db.execute(text("PRAGMA optimize"))
+    db.close()
+
+
+async def optimize_database(context):
+    await asyncio.to_thread(_optimize_database)
+
+
+def _popular_items(days: int = 30, limit: int = 5):
+    since = datetime.utcnow() - timedelta(days=days)
+    db = next(get_db())
+    rows = (
+        db.query(OrderItem.item_name, func.sum(OrderItem.quantity).label("total"))
+        .join(Order)
+        .filter(Order.created_at >= since, Order.status != OrderStatus.CANCELLED)
+        .group_by(OrderItem.item_name)
+        .order_by(func.sum(OrderItem.quantity).desc())
+        .limit(limit)
+        .all()
+    )
+    db.close()
+    return [(name, int(total)) for name, total in rows]
+
+
+async def refresh_derived(context):
+    derived["popular_items"] = await asyncio.to_thread(_popular_items)
+    derived["refreshed_at"] = datetime.utcnow()
+
+
+def _off_peak_time() -> dt_time:
+    tz = pytz.timezone(TIMEZONE)
+    return tz.localize(datetime.combine(date.today(), dt_time(hour=MAINTENANCE_HOUR))).timetz()
+
+
+def schedule_maintenance(job_queue) -> None:
+    job_queue.run_repeating(
+        guarded("expire_stale_orders", expire_stale_orders),
+        interval=ORDER_EXPIRE_INTERVAL,
+        first=ORDER_EXPIRE_INTERVAL,
+        name="expire_stale_orders",
+    )
+    job_queue.run_repeating(
+        guarded("refresh_derived", refresh_derived),
+        interval=DERIVED_REFRESH_INTERVAL,
+        first=0,
+        name="refresh_derived",
+    )
+    job_queue.run_repeating(
+        guarded("evict_idle_sessions", sessions.evict_idle),
+        interval=SESSION_SWEEP_INTERVAL,
+        first=SESSION_SWEEP_INTERVAL,
+        name="evict_idle_sessions",
+    )
+    job_queue.run_daily(
+        guarded("optimize_database", optimize_database),
+        time=_off_peak_time(),
+        name="optimize_database",
+    )
@@ -0,0 +1,156 @@
+import hashlib
+import logging
+from collections import OrderedDict
+
+import telegram
+
+from config import MESSAGE_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(value) -> bytes:
+    return hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+
+
+def text_fingerprint(text, parse_mode=None) -> bytes:
+    return _digest(f"{parse_mode}\x00{text}")
+
+
+def markup_fingerprint(reply_markup) -> bytes:
+    return _digest(reply_markup.to_json() if reply_markup is not None else None)
+
+
+class MessageFingerprints:
+    """Отпечатки последнего отправленного текста и клавиатуры по (chat_id, message_id).
+
+    Хранилище ограничено по размеру: при переполнении вытесняются
+    давно не использовавшиеся сообщения (LRU).
+    """
+
+    def __init__(self, max_entries: int = MESSAGE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key, text_fp, markup_fp):
+        self._entries[key] = (text_fp, markup_fp)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def text_unchanged(self, key, text_fp, markup_fp) -> bool:
+        entry = self._get(key)
+        if entry == (text_fp, markup_fp):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def markup_unchanged(self, key, markup_fp) -> bool:
+        entry = self._get(key)
+        if entry is not None and entry[1] == markup_fp:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def remember_text(self, key, text_fp, markup_fp):
+        self._put(key, text_fp, markup_fp)
+
+    def remember_markup(self, key, markup_fp):
+        entry = self._entries.get(key)
+        self._put(key, entry[0] if entry else None, markup_fp)
+
+    def forget(self, key):
+        self._entries.pop(key, None)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+
+fingerprints = MessageFingerprints()
+
+
+def message_key(message):
+    if message is None or not getattr(message, "message_id", None):
+        return None
+    return message.chat.id, message.message_id
+
+
+def _is_not_modified(error: telegram.error.BadRequest) -> bool:
+    return "Message is not modified" in str(error)
+
+
+async def edit_message_text(query, text, reply_markup=None, parse_mode=None) -> bool:
+    """Редактирует текст сообщения, если он или клавиатура действительно изменились.
+
+    Возвращает True, если запрос к Telegram был отправлен.
+    """
+    key = message_key(query.message)
+    text_fp = text_fingerprint(text, parse_mode)
+    markup_fp = markup_fingerprint(reply_markup)
+    if key is not None and fingerprints.text_unchanged(key, text_fp, markup_fp):
+        return False
+
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    except telegram.error.BadRequest as e:
+        if not _is_not_modified(e):
+            raise
+    if key is not None:
+        fingerprints.remember_text(key, text_fp, markup_fp)
+    return True
+
+
+async def edit_message_reply_markup(query, reply_markup=None) -> bool:
+    key = message_key(query.message)
+    markup_fp = markup_fingerprint(reply_markup)
+    if key is not None and fingerprints.markup_unchanged(key, markup_fp):
+        return False
+
+    try:
+        await query.edit_message_reply_markup(reply_markup=reply_markup)
+    except telegram.error.BadRequest as e:
+        if not _is_not_modified(e):
+            raise
+    if key is not None:
+        fingerprints.remember_markup(key, markup_fp)
+    return True
+
+
+async def replace_message(query) -> None:
+    """Удаляет сообщение, к которому привязан запрос, чтобы показать на его месте новое."""
+    fingerprints.forget(message_key(query.message))
+    try:
+        await query.message.delete()
+    except telegram.error.TelegramError as e:
+        logger.warning(f"Не удалось удалить сообщение: {e}")
+
+
+async def edit_or_replace_text(query, text, reply_markup=None, parse_mode=None) -> bool:
+    """Как edit_message_text, но сообщение с фото заменяется новым: его текст не редактируется."""
+    if not getattr(query.message, "photo", None):
+        return await edit_message_text(query, text, reply_markup=reply_markup, parse_mode=parse_mode)
+
+    await replace_message(query)
+    await query.message.chat.send_message(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    return True
@@ -0,0 +1,169 @@
+import logging
+import secrets
+
+from sqlalchemy import insert, update, or_
+from sqlalchemy.exc import IntegrityError
+
+from database import Order, OrderItem, MenuItem, OrderStatus
+
+logger = logging.getLogger(__name__)
+
+
+class EmptyCartError(Exception):
+    pass
+
+
+class OutOfStockError(Exception):
+    def __init__(self, item_names):
+        super().__init__(", ".join(item_names))
+        self.item_names = item_names
+
+
+def orderable():
+    """Условие для блюд, которые можно заказать: не скрыты и есть в наличии."""
+    return MenuItem.is_available.is_(True) & or_(MenuItem.stock.is_(None), MenuItem.stock > 0)
+
+
+def new_order_token() -> str:
+    return secrets.token_hex(8)
+
+
+def price_cart(db, cart):
+    """Возвращает строки корзины [(MenuItem, количество)] и итоговую сумму одним запросом."""
+    if not cart:
+        return [], 0
+    items = {
+        item.id: item
+        for item in db.query(MenuItem).filter(MenuItem.id.in_(list(cart.keys()))).all()
+    }
+    lines = [(items[item_id], quantity) for item_id, quantity in cart.items() if item_id in items]
+    total_price = sum(item.price * quantity for item, quantity in lines)
+    return lines, total_price
+
+
+def reserve_stock(db, lines) -> None:
+    """Списывает остатки условными UPDATE, не допуская ухода в минус.
+
+    Строка обновляется, только если блюдо доступно и остатка хватает,
+    поэтому параллельные подтверждения не могут продать больше, чем есть.
+    Для блюд без учёта остатков (stock IS NULL) NULL - n остаётся NULL.
+    """
+    sold_out = []
+    for item, quantity in lines:
+        result = db.execute(
+            update(MenuItem)
+            .where(
+                MenuItem.id == item.id,
+                MenuItem.is_available.is_(True),
+                or_(MenuItem.stock.is_(None), MenuItem.stock >= quantity),
+            )
+            .values(stock=MenuItem.stock - quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            sold_out.append(item.name)
+    if sold_out:
+        raise OutOfStockError(sold_out)
+
+
+def _order_lines(db, order):
+    item_ids = [order_item.menu_item_id for order_item in order.items if order_item.menu_item_id is not None]
+    items = {item.id: item for item in db.query(MenuItem).filter(MenuItem.id.in_(item_ids)).all()}
+    return [
+        (items[order_item.menu_item_id], order_item.quantity)
+        for order_item in order.items
+        if order_item.menu_item_id in items
+    ]
+
+
+def release_stock(db, order) -> None:
+    """Возвращает на склад позиции заказа, если они были списаны. Коммит остаётся за вызывающим."""
+    if not order.stock_reserved:
+        return
+    for order_item in order.items:
+        if order_item.menu_item_id is None:
+            continue
+        db.execute(
+            update(MenuItem)
+            .where(MenuItem.id == order_item.menu_item_id, MenuItem.stock.is_not(None))
+            .values(stock=MenuItem.stock + order_item.quantity)
+            .execution_options(synchronize_session=False)
+        )
+    order.stock_reserved = False
+
+
+def set_order_status(db, order, new_status: str) -> None:
+    """Меняет статус заказа, сохраняя соответствие остатков.
+
+    Отмена возвращает списанные позиции на склад; возврат отменённого
+    заказа в работу списывает их заново и бросает OutOfStockError, если
+    остатка уже не хватает. Коммит (или откат) остаётся за вызывающим.
+    """
+    if new_status == OrderStatus.CANCELLED:
+        release_stock(db, order)
+    elif not order.stock_reserved:
+        reserve_stock(db, _order_lines(db, order))
+        order.stock_reserved = True
+    order.status = new_status
+
+
+def cancel_order(db, order) -> None:
+    set_order_status(db, order, OrderStatus.CANCELLED)
+
+
+def find_order_by_token(db, user_id: int, token: str):
+    return db.query(Order).filter(Order.idempotency_key == token, Order.user_id == user_id).first()
+
+
+def create_order(db, user_id: int, cart, token: str):
+    """Создаёт заказ со всеми позициями в одной транзакции.
+
+    Повторный вызов с тем же токеном не пишет в базу, а возвращает уже
+    созданный заказ. Возвращает пару (заказ, создан_ли_сейчас).
+    Если какого-то блюда не хватает, бросает OutOfStockError и ничего не пишет.
+    """
+    existing = find_order_by_token(db, user_id, token)
+    if existing:
+        return existing, False
+
+    lines, total_price = price_cart(db, cart)
+    if not lines:
+        raise EmptyCartError()
+
+    try:
+        reserve_stock(db, lines)
+        order = Order(
+            user_id=user_id,
+            total_price=total_price,
+            status=OrderStatus.NEW,
+            idempotency_key=token,
+            stock_reserved=True,
+        )
+        db.add(order)
+        db.flush()
+        db.execute(
+            insert(OrderItem),
+            [
+                {
+                    "order_id": order.id,
+                    "menu_item_id": item.id,
+                    "item_name": item.name,
+                    "quantity": quantity,
+                    "price": item.price,
+                }
+                for item, quantity in lines
+            ],
+        )
+        db.commit()
+    except OutOfStockError:
+        db.rollback()
+        raise
+    except IntegrityError:
+        db.rollback()
+        existing = find_order_by_token(db, user_id, token)
+        if existing is None:
+            raise
+        logger.info(f"Повторное подтверждение заказа #{existing.id} проигнорировано")
+        return existing, False
+
+    return order, True
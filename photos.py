@@ -0,0 +1,77 @@
+import logging
+import os
+
+import telegram
+
+from config import PHOTO_DIR, THUMBNAIL_MAX_SIZE
+from database import get_db, MenuItem
+
+logger = logging.getLogger(__name__)
+
+PHOTO_CAPTION_LIMIT = 1024
+
+
+def _is_invalid_file_id(error: telegram.error.BadRequest) -> bool:
+    message = str(error).lower()
+    return "file identifier" in message or "file_id" in message
+
+
+class PhotoStore:
+    """Фото блюд: file_id из Telegram плюс локальная миниатюра на случай, если file_id протух.
+
+    Байты уходят в Telegram только один раз: при загрузке админом либо,
+    если старый file_id стал недействительным, при повторной отправке
+    миниатюры, после чего новый file_id сохраняется в базе.
+    """
+
+    def __init__(self, directory: str = PHOTO_DIR):
+        self.directory = directory
+        self._file_ids = {}
+        self.uploads = 0
+
+    def thumbnail_path(self, item_id: int) -> str:
+        return os.path.join(self.directory, f"{item_id}.jpg")
+
+    def remember(self, item_id: int, file_id: str) -> None:
+        self._file_ids[item_id] = file_id
+
+    def file_id(self, item) -> str:
+        return self._file_ids.get(item.id) or item.photo_file_id
+
+    async def save_thumbnail(self, bot, item_id: int, photo_sizes) -> None:
+        suitable = [size for size in photo_sizes if max(size.width, size.height) <= THUMBNAIL_MAX_SIZE]
+        thumbnail = suitable[-1] if suitable else photo_sizes[0]
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            photo_file = await bot.get_file(thumbnail.file_id)
+            await photo_file.download_to_drive(self.thumbnail_path(item_id))
+        except telegram.error.TelegramError as e:
+            logger.error(f"Не удалось сохранить миниатюру блюда {item_id}: {e}")
+
+    async def send(self, bot, chat_id: int, item, caption: str, reply_markup=None, parse_mode=None):
+        file_id = self.file_id(item)
+        try:
+            message = await bot.send_photo(
+                chat_id, photo=file_id, caption=caption, reply_markup=reply_markup, parse_mode=parse_mode
+            )
+        except telegram.error.BadRequest as e:
+            path = self.thumbnail_path(item.id)
+            if not _is_invalid_file_id(e) or not os.path.exists(path):
+                raise
+            logger.warning(f"file_id фото блюда {item.id} недействителен, загружаю миниатюру: {e}")
+            with open(path, "rb") as photo:
+                message = await bot.send_photo(
+                    chat_id, photo=photo, caption=caption, reply_markup=reply_markup, parse_mode=parse_mode
+                )
+            self.uploads += 1
+            file_id = message.photo[-1].file_id
+            db = next(get_db())
+            db.query(MenuItem).filter(MenuItem.id == item.id).update({MenuItem.photo_file_id: file_id})
+            db.commit()
+            db.close()
+
+        self.remember(item.id, file_id)
+        return message
+
+
+photo_store = PhotoStore()
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import sys
+import time
+from array import array
+from datetime import datetime
+
+from config import SESSION_TTL, SPILL_EVICTED_CARTS
+from database import get_db, SavedCart
+
+logger = logging.getLogger(__name__)
+
+
+class Cart:
+    """Компактная корзина: параллельные массивы int с id блюд и количествами.
+
+    Повторяет ту часть интерфейса dict, которой пользуются обработчики:
+    get, [], in, items(), keys(), len().
+    """
+
+    __slots__ = ("item_ids", "quantities")
+
+    def __init__(self, items=None):
+        self.item_ids = array("i")
+        self.quantities = array("i")
+        for item_id, quantity in (items or {}).items():
+            self[item_id] = quantity
+
+    def _index(self, item_id: int) -> int:
+        try:
+            return self.item_ids.index(item_id)
+        except ValueError:
+            return -1
+
+    def get(self, item_id: int, default=None):
+        index = self._index(item_id)
+        return self.quantities[index] if index >= 0 else default
+
+    def __getitem__(self, item_id: int) -> int:
+        index = self._index(item_id)
+        if index < 0:
+            raise KeyError(item_id)
+        return self.quantities[index]
+
+    def __setitem__(self, item_id: int, quantity: int) -> None:
+        index = self._index(item_id)
+        if quantity <= 0:
+            if index >= 0:
+                del self.item_ids[index]
+                del self.quantities[index]
+        elif index >= 0:
+            self.quantities[index] = quantity
+        else:
+            self.item_ids.append(item_id)
+            self.quantities.append(quantity)
+
+    def __contains__(self, item_id) -> bool:
+        return self._index(item_id) >= 0
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def keys(self):
+        return list(self.item_ids)
+
+    def items(self):
+        return zip(self.item_ids, self.quantities)
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.item_ids) + sys.getsizeof(self.quantities)
+
+    @classmethod
+    def from_bytes(cls, item_ids: bytes, quantities: bytes) -> "Cart":
+        cart = cls()
+        cart.item_ids.frombytes(item_ids)
+        cart.quantities.frombytes(quantities)
+        return cart
+
+
+class SessionManager:
+    """Учёт активности пользователей и вытеснение простаивающих user_data.
+
+    Непустые корзины вытесненных сессий при SPILL_EVICTED_CARTS
+    сохраняются в таблицу saved_carts и возвращаются при следующем визите.
+    Запись и чтение saved_carts идут в отдельном потоке, а все корзины
+    одного прохода сохраняются одной транзакцией.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL, spill: bool = SPILL_EVICTED_CARTS):
+        self.ttl = ttl
+        self.spill = spill
+        self._last_seen = {}
+        self.evicted = 0
+        self.spilled = 0
+        self.restored = 0
+
+    async def touch(self, user_id: int, user_data) -> None:
+        self._last_seen[user_id] = time.monotonic()
+        if "cart" not in user_data:
+            user_data["cart"] = await asyncio.to_thread(self._restore_cart, user_id) if self.spill else Cart()
+
+    def _restore_cart(self, user_id: int) -> Cart:
+        db = next(get_db())
+        saved = db.query(SavedCart).get(user_id)
+        if saved is None:
+            db.close()
+            return Cart()
+        cart = Cart.from_bytes(saved.item_ids, saved.quantities)
+        db.delete(saved)
+        db.commit()
+        db.close()
+        self.restored += 1
+        return cart
+
+    def _spill_carts(self, carts: dict) -> None:
+        saved_at = datetime.utcnow()
+        db = next(get_db())
+        for user_id, (item_ids, quantities) in carts.items():
+            db.merge(SavedCart(user_id=user_id, item_ids=item_ids, quantities=quantities, saved_at=saved_at))
+        db.commit()
+        db.close()
+
+    def _discard_saved(self, user_ids) -> None:
+        db = next(get_db())
+        db.query(SavedCart).filter(SavedCart.user_id.in_(user_ids)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+    async def evict_idle(self, context) -> None:
+        application = context.application
+        cutoff = time.monotonic() - self.ttl
+        idle = [user_id for user_id, seen in self._last_seen.items() if seen < cutoff]
+        carts = {}
+        for user_id in idle:
+            user_data = application.user_data.get(user_id)
+            cart = user_data.get("cart") if user_data is not None else None
+            if self.spill and cart:
+                carts[user_id] = (cart.item_ids.tobytes(), cart.quantities.tobytes())
+        if carts:
+            await asyncio.to_thread(self._spill_carts, carts)
+
+        # Пока корзины сохранялись, часть пользователей могла вернуться:
+        # их сессии остаются в памяти. Список считается уже после await и
+        # до вытеснения await больше нет, чтобы не сбросить user_data
+        # посреди работы обработчика.
+        returned = {user_id for user_id in idle if self._last_seen.get(user_id, 0) >= cutoff}
+        for user_id in idle:
+            if user_id in returned:
+                continue
+            self._last_seen.pop(user_id, None)
+            if user_id in carts:
+                self.spilled += 1
+            if user_id in application.user_data:
+                application.drop_user_data(user_id)
+                self.evicted += 1
+        evicted = len(idle) - len(returned)
+        if evicted:
+            logger.info(f"Вытеснено простаивающих сессий: {evicted}")
+
+        # Сохранённые копии вернувшихся пользователей удаляются, чтобы потом
+        # не восстановить их поверх новой корзины.
+        stale = [user_id for user_id in returned if user_id in carts]
+        if stale:
+            await asyncio.to_thread(self._discard_saved, stale)
+
+    def stats(self, application) -> dict:
+        carts = [data["cart"] for data in application.user_data.values() if data.get("cart")]
+        return {
+            "sessions": len(application.user_data),
+            "active": len(self._last_seen),
+            "carts": len(carts),
+            "cart_bytes": sum(cart.nbytes() for cart in carts if isinstance(cart, Cart)),
+            "evicted": self.evicted,
+            "spilled": self.spilled,
+            "restored": self.restored,
+        }
+
+
+sessions = SessionManager()
@@ -0,0 +1,233 @@
+import asyncio
+import functools
+import logging
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from telegram.ext import ConversationHandler
+from telegram.request import HTTPXRequest
+
+from config import SLOW_UPDATE_SECONDS, METRICS_HOST, METRICS_PORT, TRACE_WINDOW
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ("db", "render", "api", "total")
+
+_current_trace = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Время обработки одного апдейта по фазам.
+
+    db и api замеряются напрямую; render — всё остальное время
+    обработчика (экранирование, сборка текста и клавиатур).
+    """
+
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.perf_counter()
+        self.phases = {"db": 0.0, "api": 0.0}
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def finish(self) -> dict:
+        total = time.perf_counter() - self.started
+        self.phases["render"] = max(0.0, total - self.phases["db"] - self.phases["api"])
+        self.phases["total"] = total
+        return self.phases
+
+
+@contextmanager
+def phase(name: str):
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add(name, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Время старта хранится в контексте выполнения, а не в соединении:
+    # упавший запрос не доходит до after_cursor_execute и ничего не оставляет.
+    context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add("db", time.perf_counter() - started)
+
+
+class TracedRequest(HTTPXRequest):
+    async def do_request(self, *args, **kwargs):
+        with phase("api"):
+            return await super().do_request(*args, **kwargs)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=TRACE_WINDOW)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentile(self, q: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class TraceRegistry:
+    def __init__(self):
+        self.histograms = {}
+        self.slow_updates = 0
+        self._collectors = []
+
+    def observe(self, route: str, phases: dict) -> None:
+        for name in PHASES:
+            key = (route, name)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(phases.get(name, 0.0))
+
+        if phases["total"] >= SLOW_UPDATE_SECONDS:
+            self.slow_updates += 1
+            breakdown = ", ".join(f"{name}={phases[name] * 1000:.0f}мс" for name in PHASES)
+            logger.warning(f"Медленный апдейт {route}: {breakdown}")
+
+    def add_collector(self, collector) -> None:
+        """Регистрирует функцию, возвращающую дополнительные строки в формате Prometheus."""
+        self._collectors.append(collector)
+
+    def routes(self):
+        return sorted({route for route, _ in self.histograms})
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP bot_update_phase_seconds Время обработки апдейта по маршрутам и фазам.",
+            "# TYPE bot_update_phase_seconds histogram",
+        ]
+        for (route, name), histogram in sorted(self.histograms.items()):
+            labels = f'route="{_escape_label(route)}",phase="{name}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'bot_update_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'bot_update_phase_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"bot_update_phase_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"bot_update_phase_seconds_count{{{labels}}} {histogram.count}")
+
+        lines.append("# TYPE bot_slow_updates_total counter")
+        lines.append(f"bot_slow_updates_total {self.slow_updates}")
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = TraceRegistry()
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def route_for(callback, update) -> str:
+    query = getattr(update, "callback_query", None)
+    if query is None or not query.data:
+        return callback.__name__
+    parts = []
+    for part in query.data.split("_"):
+        if any(char.isdigit() for char in part):
+            break
+        parts.append(part)
+    return f"{callback.__name__}:{'_'.join(parts) or '*'}"
+
+
+def traced(callback):
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        trace = Trace(route_for(callback, update))
+        token = _current_trace.set(trace)
+        try:
+            return await callback(update, context)
+        finally:
+            _current_trace.reset(token)
+            registry.observe(trace.route, trace.finish())
+
+    return wrapper
+
+
+def _instrument_handler(handler) -> None:
+    if isinstance(handler, ConversationHandler):
+        for child in handler.entry_points + handler.fallbacks:
+            _instrument_handler(child)
+        for state_handlers in handler.states.values():
+            for child in state_handlers:
+                _instrument_handler(child)
+        return
+    handler.callback = traced(handler.callback)
+
+
+def instrument(application) -> None:
+    """Оборачивает все зарегистрированные обработчики трассировкой."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler)
+
+
+async def _serve_metrics(reader, writer):
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        body = registry.render_prometheus().encode("utf-8")
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            + f"Content-Length: {len(body)}\r\n".encode()
+            + b"Connection: close\r\n\r\n"
+            + body
+        )
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+_metrics_server = None
+
+
+async def start_metrics_server(application=None) -> None:
+    global _metrics_server
+    try:
+        _metrics_server = await asyncio.start_server(_serve_metrics, METRICS_HOST, METRICS_PORT)
+    except OSError as e:
+        logger.error(f"Не удалось запустить экспорт метрик на {METRICS_HOST}:{METRICS_PORT}: {e}")
+        return
+    logger.info(f"Метрики доступны на http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+
+async def stop_metrics_server(application=None) -> None:
+    if _metrics_server is not None:
+        _metrics_server.close()
+        await _metrics_server.wait_closed()